@@ -29,25 +29,21 @@ if [ ! -f "$PYTHON_ANALYSIS_SCRIPT_PATH" ]; then
 fi
 
 # --- Prepare Output CSV ---
-# Write header row to CSV in parent folder (overwrite existing file)
-echo "Receptor,Ligand,Affinity_kcal_mol,pKi,MW,LogP,TPSA,NHA,NRB,HBD,HBA,SASA_A2,QED,LE,LLE,SILE_N,SILE_SASA" > "$OUTPUT_CSV"
+# Remove the previous summary so a failed run can never leave stale results behind
+rm -f "$OUTPUT_CSV"
 
 # --- Process Logs ---
-# Find all Vina log files within the results directory (relative to parent)
-find "$RESULTS_DIR" -name "vina_output.log" -print0 | while IFS= read -r -d $'\0' logfile; do
-    echo "Processing log: $logfile"
-    
-    # Run the Python script using its full path from src/
-    # Append the output (a single CSV row) directly to the output CSV file in parent folder
-    python "$PYTHON_ANALYSIS_SCRIPT_PATH" "$logfile" --ligand_dirs $LIGAND_SOURCE_DIRS >> "$OUTPUT_CSV"
-    
-    # Optional: Check python script exit status
-    if [ $? -ne 0 ]; then
-        echo "  Warning: Python script failed for $logfile. Check stderr output. Continuing..."
-        # Write a placeholder or error marker to the CSV if needed
-        # echo "$(basename $logfile),Error,,Processing Failed,,,,,,,,,,,,,," >> "$OUTPUT_CSV" 
-    fi
-done
+# Score every Vina log within the results directory (relative to parent) in a single
+# Python run; the script parallelizes across CPU cores and writes the full CSV
+# (header included) to the output file in parent folder.
+python "$PYTHON_ANALYSIS_SCRIPT_PATH" --batch "${RESULTS_DIR}/**/vina_output.log" \
+    --ligand_dirs $LIGAND_SOURCE_DIRS --output "$OUTPUT_CSV"
+
+# Check python script exit status; stop the pipeline rather than plot missing data
+if [ $? -ne 0 ]; then
+    echo "Error: Python script failed while processing logs in $RESULTS_DIR. Check stderr output."
+    exit 1
+fi
 
 echo "--- Results Extraction and Analysis Finished ---"
 echo "Summary saved to: $OUTPUT_CSV"
@@ -1,133 +1,280 @@
+import matplotlib
+matplotlib.use('Agg') # Non-interactive backend, safe to use from worker processes
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import csv
 import numpy as np
+import concurrent.futures
+import functools
+from multiprocessing import cpu_count
+from pki_utils import calculate_pKi_array
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None # PyArrow is optional; pandas is used to read the CSV without it
 
 
 # --- Configuration ---
 CSV_FILE = "docking_summary_metrics.csv"
-PLOT_DIR = "plots" 
-TOP_N_LIGANDS = 10 
-
+PLOT_DIR = "plots"
+TOP_N_LIGANDS = 10
+KDE_MAX_POINTS = 5000 # Skip the KDE overlay on the affinity histogram above this many rows
+# Shared savefig options: dpi sets the resolution of rasterized layers embedded in the SVGs,
+# and dropping the Date metadata skips the timestamp (and keeps reruns byte-identical)
+SAVE_KW = dict(dpi=100, metadata={'Date': None})
+NUMERIC_COLS = ['Affinity_kcal_mol', 'pKi', 'MW', 'LogP', 'TPSA', 'NHA', 'NRB',
+                'HBD', 'HBA', 'SASA_A2', 'QED', 'LE', 'LLE', 'SILE_N', 'SILE_SASA']
 
-# Create plot directory
-os.makedirs(PLOT_DIR, exist_ok=True)
 
-# --- Load Data ---
-try:
-    df = pd.read_csv(CSV_FILE)
-    print(f"Successfully loaded {CSV_FILE}")
-    
-    # 1. Clean Numeric Columns
-    numeric_cols = ['Affinity_kcal_mol', 'pKi', 'MW', 'LogP', 'TPSA', 'NHA', 'NRB', 
-                    'HBD', 'HBA', 'SASA_A2', 'QED', 'LE', 'LLE', 'SILE_N', 'SILE_SASA']
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # 2. Drop invalid rows
-    df.dropna(subset=['Affinity_kcal_mol', 'Receptor', 'Ligand'], inplace=True)
-    
-
-except FileNotFoundError:
-    print(f"Error: CSV file not found at {CSV_FILE}")
-    exit(1)
-except Exception as e:
-    print(f"Error loading CSV: {e}")
-    exit(1)
-
-# --- Plotting Functions ---
-
-# Set global style
+# Set global style (module level so worker processes pick it up too)
 sns.set_theme(style="whitegrid")
 plt.rcParams['svg.fonttype'] = 'none'
+plt.rcParams.update({
+    'text.parse_math': False,        # Titles/labels (incl. receptor and ligand names) contain no mathtext
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,  # Drop near-colinear vertices when drawing paths
+    'agg.path.chunksize': 10000,
+    'figure.max_open_warning': 0,
+})
 
-# 1. Distribution of Affinity Scores
-plt.figure(figsize=(8, 5))
-sns.histplot(df['Affinity_kcal_mol'], kde=True, bins=20, color='teal')
-plt.title('Distribution of Docking Affinity Scores')
-plt.xlabel('Affinity (kcal/mol)')
-plt.savefig(os.path.join(PLOT_DIR, '1_affinity_distribution.svg'))
-plt.close()
-
-# 2. Box Plot per Receptor
-sorted_receptors = sorted(df['Receptor'].unique())
-if len(sorted_receptors) > 0:
-    plt.figure(figsize=(max(2, len(sorted_receptors)*0.75), 6))
-    sns.boxplot(x='Receptor', y='Affinity_kcal_mol', data=df, order=sorted_receptors, hue='Receptor', palette="icefire", legend=False)
-    sns.stripplot(x='Receptor', y='Affinity_kcal_mol', data=df, order=sorted_receptors, 
-                  color='black', alpha=0.3, size=3, jitter=True) # Add points for detail
-    plt.title('Affinity Scores per Receptor')
-    plt.xticks(rotation=0, ha='right')
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOT_DIR, '2_affinity_boxplot.svg'))
-    plt.close()
 
-# 3. Pareto Plot (Affinity vs MW) - The "Drug Discovery" Plot
-# We want to highlight the bottom-left corner (High Affinity [more negative], Low MW)
-plt.figure(figsize=(10, 7))
-sns.scatterplot(data=df, x='MW', y='Affinity_kcal_mol', hue='Receptor', style='Receptor', s=100, alpha=0.8)
-plt.title('Pareto Efficiency: Affinity vs. Molecular Weight')
-plt.xlabel('Molecular Weight (Da)')
-plt.ylabel('Affinity (kcal/mol)')
-plt.axhline(y=-7.0, color='r', linestyle='--', alpha=0.5, label='Hit Cutoff (-7 kcal/mol)')
-plt.axvline(x=500, color='r', linestyle='--', alpha=0.5, label='Lipinski Cutoff (500 Da)')
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, '3_pareto_affinity_vs_mw.svg'))
-plt.close()
-
-# 4. Top N Ligands per Receptor (Bar Chart)
-for receptor in sorted_receptors:
-    # Get top binders (most negative affinity)
-    top_df = df[df['Receptor'] == receptor].sort_values('Affinity_kcal_mol', ascending=True).head(TOP_N_LIGANDS)
-    
-    if top_df.empty: continue
-        
-    plt.figure(figsize=(8, max(4, len(top_df)*0.4)))
-    sns.barplot(x='Affinity_kcal_mol', y='Ligand', data=top_df, hue='Ligand', palette='icefire', legend=False)
-    plt.title(f'Top {len(top_df)} Ligands: {receptor}')
+def _read_summary_csv(csv_file):
+    """Reads the summary CSV with all metric columns typed as float64."""
+    # Report missing metric columns up front; both readers below skip them silently
+    with open(csv_file, newline='') as f:
+        header = next(csv.reader(f), [])
+    for col in NUMERIC_COLS:
+        if col not in header:
+            print(f"Warning: column '{col}' missing from {csv_file}")
+
+    if pa is not None:
+        # Arrow parses straight into typed columns, so no per-column coercion pass is needed
+        convert_options = pacsv.ConvertOptions(
+            column_types={col: pa.float64() for col in NUMERIC_COLS},
+            null_values=["NA", "", "NaN"],
+            strings_can_be_null=True)
+        try:
+            return pacsv.read_csv(csv_file, convert_options=convert_options).to_pandas()
+        except pa.ArrowInvalid:
+            pass # e.g. a stray non-numeric marker in a metric column; let pandas coerce it
+
+    df = pd.read_csv(csv_file)
+    present_cols = [col for col in NUMERIC_COLS if col in df.columns]
+    # Coerce all metric columns in a single pass
+    df[present_cols] = df[present_cols].apply(pd.to_numeric, errors='coerce')
+    return df
+
+
+def _load_summary(csv_file):
+    """Loads the summary table, reusing a Parquet copy next to the CSV while it is up to date.
+       The Parquet cache needs PyArrow; without it the CSV is simply read every run.
+    """
+    if pa is None:
+        return _read_summary_csv(csv_file)
+
+    parquet_file = os.path.splitext(csv_file)[0] + ".parquet"
+    if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file):
+        try:
+            return pd.read_parquet(parquet_file, engine='pyarrow')
+        except Exception as e:
+            print(f"Warning: could not read Parquet cache {parquet_file} ({e}). Re-reading {csv_file}.")
+
+    df = _read_summary_csv(csv_file)
+    try:
+        df.to_parquet(parquet_file, engine='pyarrow', compression='zstd')
+    except Exception as e:
+        print(f"Warning: could not write Parquet cache {parquet_file} ({e}).")
+    return df
+
+
+def _pairwise_corr(arr):
+    """
+    Pearson correlation between the columns of arr using, for each pair, only the rows
+    where both values are present -- the same numbers as DataFrame.corr(). The sums for
+    every pair come from a few matrix products (BLAS) instead of a column-pair loop.
+    Args:
+        arr (np.ndarray): 2D float array, missing values as NaN
+    Returns:
+        np.ndarray: Square correlation matrix (NaN where a pair has no variance)
+    """
+    present = np.isfinite(arr)
+    m = present.astype(np.float64)
+    x = np.where(present, arr, 0.0)
+    # Center on the column means first; correlation is unaffected, the sums stay well conditioned
+    x = np.where(present, x - x.sum(axis=0) / np.maximum(m.sum(axis=0), 1.0), 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = m.T @ m               # Rows shared by each pair (i, j)
+        s = x.T @ m               # s[i, j]: sum of column i over the rows shared with j
+        ss = (x * x).T @ m        # ss[i, j]: sum of squares of column i over those rows
+        cov = x.T @ x - s * s.T / n
+        var = ss - s * s / n      # var[i, j]: spread of column i within pair (i, j)
+        corr = cov / np.sqrt(var * var.T)
+    corr[(n < 2) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+@functools.lru_cache(maxsize=None)
+def _bar_palette(n_colors):
+    """Bar colors for a top-ligand chart, resolved once per bar count."""
+    return sns.color_palette('icefire', n_colors)
+
+
+def _plot_top_ligands(tasks):
+    """
+    Worker function to render the top-ligand bar charts for a batch of receptors,
+    reusing one figure instead of building a new one per receptor.
+    Args:
+        tasks (list): (receptor, top_df) tuples, top_df holding only that receptor's top binders
+    Returns:
+        list: Paths of the saved plots
+    """
+    fig, ax = plt.subplots()
+    output_paths = []
+    try:
+        for receptor, top_df in tasks:
+            ax.clear()
+            fig.set_size_inches(8, max(4, len(top_df)*0.4))
+            positions = np.arange(len(top_df))
+            ax.barh(positions, top_df['Affinity_kcal_mol'], color=_bar_palette(len(top_df)))
+            ax.set_yticks(positions)
+            ax.set_yticklabels(top_df['Ligand'])
+            ax.set_ylim(len(top_df) - 0.5, -0.5) # Best binder on top
+            ax.yaxis.grid(False)
+            ax.set_title(f'Top {len(top_df)} Ligands: {receptor}')
+            ax.set_xlabel('Affinity (kcal/mol)')
+            ax.set_ylabel('Ligand')
+            fig.tight_layout()
+            output_path = os.path.join(PLOT_DIR, f'4_top_ligands_{receptor}.svg')
+            fig.savefig(output_path, **SAVE_KW)
+            output_paths.append(output_path)
+    finally:
+        plt.close(fig)
+    return output_paths
+
+
+def main():
+    # Create plot directory
+    os.makedirs(PLOT_DIR, exist_ok=True)
+
+    # --- Load Data ---
+    try:
+        # 1. Load with Numeric Columns already cleaned
+        df = _load_summary(CSV_FILE)
+        print(f"Successfully loaded {CSV_FILE}")
+
+        # Recompute pKi from Affinity in one vectorized pass rather than trusting per-row values
+        df['pKi'] = calculate_pKi_array(df['Affinity_kcal_mol'].to_numpy())
+
+        # 2. Drop invalid rows
+        df.dropna(subset=['Affinity_kcal_mol', 'Receptor', 'Ligand'], inplace=True)
+
+
+    except FileNotFoundError:
+        print(f"Error: CSV file not found at {CSV_FILE}")
+        exit(1)
+    except Exception as e:
+        print(f"Error loading CSV: {e}")
+        exit(1)
+
+    # --- Plotting Functions ---
+
+    # 1. Distribution of Affinity Scores
+    plt.figure(figsize=(8, 5))
+    sns.histplot(df['Affinity_kcal_mol'], kde=len(df) <= KDE_MAX_POINTS, bins=20, color='teal')
+    plt.title('Distribution of Docking Affinity Scores')
     plt.xlabel('Affinity (kcal/mol)')
-    plt.tight_layout()
-    plt.savefig(os.path.join(PLOT_DIR, f'4_top_ligands_{receptor}.svg'))
+    plt.savefig(os.path.join(PLOT_DIR, '1_affinity_distribution.svg'), **SAVE_KW)
     plt.close()
 
-# 5. Correlation Heatmap
-numeric_df = df.select_dtypes(include=[np.number])
-if not numeric_df.empty:
-    plt.figure(figsize=(10, 8))
-    corr = numeric_df.corr()
-    sns.heatmap(corr, annot=True, cmap='icefire', fmt=".2f", vmin=-1, vmax=1)
-    plt.title('Correlation of Metrics')
+    # 2. Box Plot per Receptor
+    sorted_receptors = sorted(df['Receptor'].unique())
+    # Resolve the receptor -> color mapping once and share it between the per-receptor plots
+    receptor_palette = dict(zip(sorted_receptors, sns.color_palette('icefire', len(sorted_receptors))))
+    if len(sorted_receptors) > 0:
+        plt.figure(figsize=(max(2, len(sorted_receptors)*0.75), 6))
+        sns.boxplot(x='Receptor', y='Affinity_kcal_mol', data=df, order=sorted_receptors, hue='Receptor', palette=receptor_palette, legend=False)
+        sns.stripplot(x='Receptor', y='Affinity_kcal_mol', data=df, order=sorted_receptors,
+                      color='black', alpha=0.3, size=3, jitter=True, rasterized=True) # Add points for detail
+        plt.title('Affinity Scores per Receptor')
+        plt.xticks(rotation=0, ha='right')
+        plt.tight_layout()
+        plt.savefig(os.path.join(PLOT_DIR, '2_affinity_boxplot.svg'), **SAVE_KW)
+        plt.close()
+
+    # 3. Pareto Plot (Affinity vs MW) - The "Drug Discovery" Plot
+    # We want to highlight the bottom-left corner (High Affinity [more negative], Low MW)
+    plt.figure(figsize=(10, 7))
+    sns.scatterplot(data=df, x='MW', y='Affinity_kcal_mol', hue='Receptor', style='Receptor', hue_order=sorted_receptors,
+                    style_order=sorted_receptors, palette=receptor_palette, s=100, alpha=0.8, rasterized=True)
+    plt.title('Pareto Efficiency: Affinity vs. Molecular Weight')
+    plt.xlabel('Molecular Weight (Da)')
+    plt.ylabel('Affinity (kcal/mol)')
+    plt.axhline(y=-7.0, color='r', linestyle='--', alpha=0.5, label='Hit Cutoff (-7 kcal/mol)')
+    plt.axvline(x=500, color='r', linestyle='--', alpha=0.5, label='Lipinski Cutoff (500 Da)')
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig(os.path.join(PLOT_DIR, '5_correlation_heatmap.svg'))
+    plt.savefig(os.path.join(PLOT_DIR, '3_pareto_affinity_vs_mw.svg'), **SAVE_KW)
     plt.close()
 
-# --- NEW: Generate Text Summary Report ---
-summary_file = os.path.join(PLOT_DIR, 'top_candidates_summary.txt')
-with open(summary_file, 'w') as f:
-    f.write("=== DOCKING CANDIDATE SUMMARY ===\n")
-    f.write(f"Total pairs analyzed: {len(df)}\n\n")
-    
-    for receptor in sorted_receptors:
-        rec_df = df[df['Receptor'] == receptor].sort_values('Affinity_kcal_mol', ascending=True)
-        best_ligand = rec_df.iloc[0]
-        
-        f.write(f"--- Receptor: {receptor} ---\n")
-        f.write(f"Top Candidate: {best_ligand['Ligand']}\n")
-        f.write(f"  Affinity: {best_ligand['Affinity_kcal_mol']} kcal/mol\n")
-        if 'pKi' in best_ligand:
-            f.write(f"  pKi: {best_ligand['pKi']:.2f}\n")
-        if 'LE' in best_ligand:
-            f.write(f"  Ligand Efficiency: {best_ligand['LE']:.3f}\n")
-        
-        f.write("\nTop 5 List:\n")
-        for i, row in rec_df.head(5).iterrows():
-            f.write(f"  {i+1}. {row['Ligand']} ({row['Affinity_kcal_mol']} kcal/mol)\n")
-        f.write("\n")
-
-print(f"\nAnalysis Complete!")
-print(f"Plots saved in: {PLOT_DIR}")
-print(f"Summary report: {summary_file}")
+    # 4. Top N Ligands per Receptor (Bar Chart)
+    # Rank every receptor's ligands in one sorted pass (best binder = most negative affinity)
+    # and keep the top N, instead of filtering and sorting df once per receptor.
+    # Only the small top-N slice is sent to the workers to keep pickling cheap.
+    df_sorted = df.sort_values(['Receptor', 'Affinity_kcal_mol'], kind='stable')
+    top_all = df_sorted[df_sorted.groupby('Receptor').cumcount() < TOP_N_LIGANDS]
+    tasks = [(receptor, top_df[['Ligand', 'Affinity_kcal_mol']])
+             for receptor, top_df in top_all.groupby('Receptor', sort=False)]
+
+    if tasks:
+        # Receptors are independent, so render them in parallel; each worker gets one
+        # batch of receptors and draws them all on a single reused figure
+        workers = min(cpu_count(), len(tasks))
+        batches = [tasks[i::workers] for i in range(workers)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_plot_top_ligands, batches))
+
+    # 5. Correlation Heatmap
+    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    if len(numeric_cols) > 0:
+        plt.figure(figsize=(10, 8))
+        arr = df[numeric_cols].to_numpy(dtype=np.float64)
+        corr = pd.DataFrame(_pairwise_corr(arr), index=numeric_cols, columns=numeric_cols)
+        sns.heatmap(corr, annot=True, cmap='icefire', fmt=".2f", vmin=-1, vmax=1)
+        plt.title('Correlation of Metrics')
+        plt.tight_layout()
+        plt.savefig(os.path.join(PLOT_DIR, '5_correlation_heatmap.svg'), **SAVE_KW)
+        plt.close()
+
+    # --- NEW: Generate Text Summary Report ---
+    summary_file = os.path.join(PLOT_DIR, 'top_candidates_summary.txt')
+    with open(summary_file, 'w') as f:
+        f.write("=== DOCKING CANDIDATE SUMMARY ===\n")
+        f.write(f"Total pairs analyzed: {len(df)}\n\n")
+
+        for receptor, receptor_df in df.groupby('Receptor', sort=True):
+            rec_df = receptor_df.nsmallest(5, 'Affinity_kcal_mol')
+            best_ligand = rec_df.iloc[0]
+
+            f.write(f"--- Receptor: {receptor} ---\n")
+            f.write(f"Top Candidate: {best_ligand['Ligand']}\n")
+            f.write(f"  Affinity: {best_ligand['Affinity_kcal_mol']} kcal/mol\n")
+            if 'pKi' in best_ligand:
+                f.write(f"  pKi: {best_ligand['pKi']:.2f}\n")
+            if 'LE' in best_ligand:
+                f.write(f"  Ligand Efficiency: {best_ligand['LE']:.3f}\n")
+
+            f.write("\nTop 5 List:\n")
+            for i, row in rec_df.iterrows():
+                f.write(f"  {i+1}. {row['Ligand']} ({row['Affinity_kcal_mol']} kcal/mol)\n")
+            f.write("\n")
+
+    print(f"\nAnalysis Complete!")
+    print(f"Plots saved in: {PLOT_DIR}")
+    print(f"Summary report: {summary_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,81 @@
 import sys
 import os
-import re
+import glob
 import math
 import argparse
 import warnings
-from rdkit import Chem
+import functools
+import collections
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from rdkit import Chem, rdBase
 from rdkit.Chem import Descriptors, QED, rdMolDescriptors, Crippen
+from pki_utils import RT, calculate_pKi_array
 
-# Constants for pKi calculation
-R = 1.987204259e-3  # Ideal gas constant in kcal/(mol·K)
-T = 298.15          # Standard temperature in Kelvin (approx. 25 C)
-RT = R * T
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None # Numba is optional: without it the batch kernel uses whole-array NumPy operations
+
+# On-disk descriptor cache shared by worker processes and across pipeline runs
+DESCRIPTOR_CACHE_DIR = ".rdkit_cache"
+
+def _descriptor_cache(func):
+    """Memoizes func with joblib.Memory in DESCRIPTOR_CACHE_DIR, created on first call so that
+       importing this module has no side effects. Without joblib (optional) it falls back to
+       an in-process lru_cache.
+    """
+    cached = None
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        nonlocal cached
+        if cached is None:
+            try:
+                from joblib import Memory
+                cached = Memory(location=DESCRIPTOR_CACHE_DIR, verbose=0).cache(func)
+            except ImportError:
+                cached = functools.lru_cache(maxsize=None)(func)
+        return cached(*args)
+    return wrapper
+
+# Warning counts per category. In batch mode warnings are only counted (warning per
+# row is costly and floods stderr) and reported once as a summary at the end.
+_WARN_COUNTS = collections.Counter()
+_DEFER_WARNINGS = False
+
+def _warn(key, message):
+    """Emits a warning, or only counts it under `key` while warnings are deferred."""
+    _WARN_COUNTS[key] += 1
+    if not _DEFER_WARNINGS:
+        warnings.warn(message)
+
+def _emit_warning_summary():
+    """Emits one warning per category counted while warnings were deferred."""
+    for key, count in sorted(_WARN_COUNTS.items()):
+        if count:
+            warnings.warn(f"{key}: {count} occurrences")
+    _WARN_COUNTS.clear()
+
+# Bytes read from each end of a Vina log (names are near the top, the affinity table at the bottom)
+LOG_HEAD_BYTES = 4096
+LOG_TAIL_BYTES = 4096
+
+# Internal result keys and the matching CSV header columns
+RESULT_KEYS = [
+    "Receptor", "Ligand", "Affinity", "pKi", "MW", "LogP", "TPSA", "NHA", "NRB",
+    "HBD", "HBA", "SASA", "QED", "LE", "LLE", "SILE_N", "SILE_SASA"
+]
+CSV_HEADER = [
+    "Receptor", "Ligand", "Affinity_kcal_mol", "pKi", "MW", "LogP", "TPSA", "NHA", "NRB",
+    "HBD", "HBA", "SASA_A2", "QED", "LE", "LLE", "SILE_N", "SILE_SASA"
+]
+CSV_DECIMALS = {
+    "Affinity_kcal_mol": 3, "LE": 3, "SILE_N": 3,
+    "pKi": 2, "MW": 2, "LogP": 2, "TPSA": 2, "SASA_A2": 2, "QED": 2, "LLE": 2, "SILE_SASA": 2
+}
+CSV_COUNT_COLUMNS = ["NHA", "NRB", "HBD", "HBA"]
 
 def calculate_pKi(delta_G_kcal_mol):
     """Converts Vina Affinity (ΔG in kcal/mol) to pKi."""
@@ -23,13 +88,40 @@ def calculate_pKi(delta_G_kcal_mol):
         # pKi = -log10(Ki)
         # Avoid math domain error if Ki is zero or negative (shouldn't happen with exp)
         if ki <= 0: 
-             warnings.warn(f"Calculated Ki is non-positive ({ki}) from Affinity {delta_G_kcal_mol}. Cannot calculate pKi.")
+             _warn("pKi_nonpositive_Ki", f"Calculated Ki is non-positive ({ki}) from Affinity {delta_G_kcal_mol}. Cannot calculate pKi.")
              return None
         pki = -math.log10(ki)
         return pki
     except (ValueError, TypeError, OverflowError) as e:
-        warnings.warn(f"Could not calculate pKi for affinity {delta_G_kcal_mol}: {e}")
+        _warn("pKi_failed", f"Could not calculate pKi for affinity {delta_G_kcal_mol}: {e}")
+        return None
+
+def _intrinsic_descriptors(mol):
+    """Calculates the descriptors that depend only on the molecular graph (not on 3D coordinates)."""
+    return {
+        "MW": Descriptors.MolWt(mol),
+        "LogP": Crippen.MolLogP(mol),
+        "TPSA": Descriptors.TPSA(mol),
+        "NHA": mol.GetNumHeavyAtoms(),
+        "NRB": Descriptors.NumRotatableBonds(mol),
+        "HBD": Descriptors.NumHDonors(mol),
+        "HBA": Descriptors.NumHAcceptors(mol),
+        "QED": QED.qed(mol),
+    }
+
+@_descriptor_cache
+def _descriptors_by_smiles(smiles, rdkit_version):
+    """Cached _intrinsic_descriptors keyed on canonical SMILES, so a ligand docked
+       against several receptors is only described once. Explicit hydrogens are kept
+       so the rebuilt graph matches the loaded molecule (NRB/HBA depend on them).
+       rdkit_version is part of the key so an RDKit upgrade never reuses stale values.
+    """
+    params = Chem.SmilesParserParams()
+    params.removeHs = False
+    mol = Chem.MolFromSmiles(smiles, params)
+    if mol is None:
         return None
+    return _intrinsic_descriptors(mol)
 
 def calculate_ligand_metrics(mol):
     """Calculates various metrics for an RDKit molecule object."""
@@ -38,28 +130,57 @@ def calculate_ligand_metrics(mol):
         
     try:
         Chem.SanitizeMol(mol) # Ensure sanitization
-        metrics = {}
-        metrics["MW"] = Descriptors.MolWt(mol)
-        metrics["LogP"] = Crippen.MolLogP(mol)
-        metrics["TPSA"] = Descriptors.TPSA(mol)
-        metrics["NHA"] = mol.GetNumHeavyAtoms()
-        metrics["NRB"] = Descriptors.NumRotatableBonds(mol)
-        metrics["HBD"] = Descriptors.NumHDonors(mol)
-        metrics["HBA"] = Descriptors.NumHAcceptors(mol)
+        cached = _descriptors_by_smiles(Chem.MolToSmiles(mol), rdBase.rdkitVersion)
+        # Copy so the cached dict is never modified; compute directly if the SMILES did not round-trip
+        metrics = dict(cached) if cached is not None else _intrinsic_descriptors(mol)
         # SASA calculation requires 3D coordinates. Use LabuteASA as a common choice.
         # Ensure conformer exists - might need explicit generation if input was 2D/bad.
         if mol.GetNumConformers() > 0:
              metrics["SASA"] = rdMolDescriptors.CalcLabuteASA(mol)
         else:
-             warnings.warn("Molecule has no conformer, cannot calculate SASA.")
+             _warn("SASA_no_conformer", "Molecule has no conformer, cannot calculate SASA.")
              metrics["SASA"] = None # Or could try generating one: AllChem.EmbedMolecule(mol); AllChem.UFFOptimizeMolecule(mol)
-        metrics["QED"] = QED.qed(mol)
         return metrics
     except Exception as e:
-        warnings.warn(f"Error calculating RDKit metrics: {e}")
+        _warn("RDKit_metrics_failed", f"Error calculating RDKit metrics: {e}")
         return {k: None for k in ["MW", "LogP", "TPSA", "NHA", "NRB", "HBD", "HBA", "SASA", "QED"]}
 
 
+def _read_line_after(buf, label, start=0):
+    """Returns the bytes following `label` up to the end of its line, or None if absent."""
+    i = buf.find(label, start)
+    if i == -1:
+        return None
+    i += len(label)
+    j = buf.find(b"\n", i)
+    return buf[i:] if j == -1 else buf[i:j]
+
+def _find_log_pdbqt_path(buf, label):
+    """Extracts the .pdbqt path from a Vina log line such as 'Ligand: x.pdbqt'."""
+    value = _read_line_after(buf, label)
+    if value is None:
+        return None
+    value = value.decode(errors="replace").strip()
+    end = value.rfind(".pdbqt")
+    return value[:end + len(".pdbqt")] if end != -1 else None
+
+def _find_mode1_affinity(buf):
+    """Reads the mode 1 affinity from the row following the Vina results table separator."""
+    i = buf.find(b"-----+")
+    if i == -1:
+        return None
+    line_start = buf.find(b"\n", i)
+    if line_start == -1:
+        return None
+    row = _read_line_after(buf, b"\n", line_start)
+    fields = row.split() if row else []
+    if len(fields) < 2 or fields[0] != b"1":
+        return None
+    try:
+        return float(fields[1])
+    except ValueError:
+        return None
+
 def parse_vina_log(log_file):
     """Parses Vina log file to extract receptor, ligand, and best affinity.
        Uses log content first, falls back to directory structure for names.
@@ -71,52 +192,50 @@ def parse_vina_log(log_file):
     ligand_parsed_from_log = False
     
     # --- Attempt 1: Parse Info from Log Content ---
-    # Corrected regex for receptor line
-    receptor_pattern = re.compile(r"Rigid receptor:\s*(.*\.pdbqt)") 
-    # Ligand regex should be correct
-    ligand_pattern = re.compile(r"Ligand:\s*(.*\.pdbqt)")
-    # Affinity regex for mode 1
-    affinity_pattern = re.compile(r"^\s+1\s+([-+]?\d*\.?\d+)") 
-
+    # Receptor/ligand lines sit at the top of a Vina log and the affinity table at the
+    # bottom, so only read a block from each end and search them with bytes.find.
+    # The whole file is only read if something was not found there.
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                # Find receptor path from log
-                if not receptor_parsed_from_log: # Only parse once
-                    receptor_match = receptor_pattern.search(line)
-                    if receptor_match:
-                        # Extract base name without path/extension
-                        receptor = os.path.basename(receptor_match.group(1).strip()).replace(".pdbqt", "")
-                        receptor_parsed_from_log = True
-                    
-                # Find ligand path from log
-                if not ligand_parsed_from_log: # Only parse once
-                    ligand_match = ligand_pattern.search(line)
-                    if ligand_match:
-                         # Extract base name without path/extension
-                        ligand = os.path.basename(ligand_match.group(1).strip()).replace(".pdbqt", "")
-                        ligand_parsed_from_log = True
-
-                # Find the first mode's affinity
-                if affinity is None: # Only parse once
-                     affinity_match = affinity_pattern.match(line)
-                     if affinity_match:
-                         affinity = float(affinity_match.group(1))
-                         # Optimization: if we have affinity and both names from log, can stop early
-                         if receptor_parsed_from_log and ligand_parsed_from_log:
-                             break 
-            
-            # Check if affinity was found even if loop finished
-            if affinity is None:
-                 # Might need to re-read or search again if file is large and break was hit early?
-                 # For typical Vina logs, affinity table is near the end, so this is unlikely needed.
-                 pass # Keep affinity as None if not found by the end
+        with open(log_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(LOG_HEAD_BYTES)
+            if size > len(head):
+                f.seek(-min(LOG_TAIL_BYTES, size), os.SEEK_END)
+                tail = f.read()
+            else:
+                tail = head # Whole log already read
+
+            receptor_path = _find_log_pdbqt_path(head, b"Rigid receptor:")
+            ligand_path = _find_log_pdbqt_path(head, b"Ligand:")
+            # Find the first mode's affinity
+            affinity = _find_mode1_affinity(tail)
+
+            if size > len(head) and (receptor_path is None or ligand_path is None or affinity is None):
+                # Unusual layout (e.g. long banner or trailing output): scan the full log
+                f.seek(0)
+                content = f.read()
+                receptor_path = receptor_path or _find_log_pdbqt_path(content, b"Rigid receptor:")
+                ligand_path = ligand_path or _find_log_pdbqt_path(content, b"Ligand:")
+                if affinity is None:
+                    affinity = _find_mode1_affinity(content)
+
+        # Find receptor path from log
+        if receptor_path:
+            # Extract base name without path/extension
+            receptor = os.path.basename(receptor_path).replace(".pdbqt", "")
+            receptor_parsed_from_log = True
+
+        # Find ligand path from log
+        if ligand_path:
+            # Extract base name without path/extension
+            ligand = os.path.basename(ligand_path).replace(".pdbqt", "")
+            ligand_parsed_from_log = True
 
     except FileNotFoundError:
-        warnings.warn(f"Log file not found: {log_file}")
+        _warn("log_not_found", f"Log file not found: {log_file}")
         return None, None, None
     except Exception as e:
-        warnings.warn(f"Error reading log file {log_file}: {e}")
+        _warn("log_read_error", f"Error reading log file {log_file}: {e}")
         # Proceed to fallback for names, affinity might be None
 
     # --- Attempt 2: Fallback for Names using Directory Structure ---
@@ -136,18 +255,18 @@ def parse_vina_log(log_file):
             else:
                  # Only warn if names are *still* missing after fallback attempt
                  if receptor is None or ligand is None:
-                      warnings.warn(f"Could not parse receptor/ligand name from log content OR directory structure: {log_dir}")
+                      _warn("names_unparsed", f"Could not parse receptor/ligand name from log content OR directory structure: {log_dir}")
         except Exception as e:
             # Only warn if names are *still* missing
             if receptor is None or ligand is None:
-                warnings.warn(f"Error parsing directory path {log_file} for names: {e}")
+                _warn("names_dir_parse_error", f"Error parsing directory path {log_file} for names: {e}")
 
     # Final checks and warnings
     if receptor is None or ligand is None:
-         warnings.warn(f"Failed to determine Receptor or Ligand name for {log_file}")
+         _warn("names_missing", f"Failed to determine Receptor or Ligand name for {log_file}")
          
     if affinity is None:
-         warnings.warn(f"Could not parse affinity score (mode 1) from log: {log_file}")
+         _warn("affinity_missing", f"Could not parse affinity score (mode 1) from log: {log_file}")
 
     return receptor, ligand, affinity
 
@@ -176,20 +295,62 @@ def calculate_efficiency_metrics(affinity, pki, ligand_metrics):
         try:
              metrics["SILE_N"] = neg_affinity / (nha ** nha_exp)
         except ZeroDivisionError: # Should be caught by nha > 0, but defensive
-             warnings.warn(f"Heavy atom count is zero for SILE_N calculation.")
+             _warn("SILE_N_zero_NHA", f"Heavy atom count is zero for SILE_N calculation.")
         except ValueError: # e.g. negative base with non-integer exponent
-             warnings.warn(f"ValueError during SILE_N calculation (NHA={nha}).")
+             _warn("SILE_N_value_error", f"ValueError during SILE_N calculation (NHA={nha}).")
 
 
     # SILE_SASA = pKi / SASA 
     if pki is not None and sasa is not None and sasa > 1e-6: # Avoid division by zero/tiny SASA
         metrics["SILE_SASA"] = pki / sasa
     elif sasa is not None and sasa <= 1e-6:
-         warnings.warn(f"SASA is near zero ({sasa}), cannot calculate SILE_SASA.")
+         _warn("SILE_SASA_zero_SASA", f"SASA is near zero ({sasa}), cannot calculate SILE_SASA.")
 
 
     return metrics
 
+def _eff_kernel_numpy(aff, pki, nha, logp, sasa, out_le, out_lle, out_sile_n, out_sile_sasa):
+    """Fills the efficiency metric arrays in place; missing inputs are NaN and propagate."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_atoms = nha > 0
+        out_le[:] = np.where(has_atoms, -aff / nha, np.nan)
+        out_sile_n[:] = np.where(has_atoms, -aff / nha ** 0.3, np.nan)
+        out_lle[:] = pki - logp
+        out_sile_sasa[:] = np.where(sasa > 1e-6, pki / sasa, np.nan)
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _eff_kernel(aff, pki, nha, logp, sasa, out_le, out_lle, out_sile_n, out_sile_sasa):
+        """Numba version of _eff_kernel_numpy: one fused, multi-core pass over the rows."""
+        for i in prange(aff.shape[0]):
+            if nha[i] > 0:
+                out_le[i] = -aff[i] / nha[i]
+                out_sile_n[i] = -aff[i] / (nha[i] ** 0.3)
+            else:
+                out_le[i] = np.nan
+                out_sile_n[i] = np.nan
+            out_lle[i] = pki[i] - logp[i]
+            if sasa[i] > 1e-6:
+                out_sile_sasa[i] = pki[i] / sasa[i]
+            else:
+                out_sile_sasa[i] = np.nan
+else:
+    _eff_kernel = _eff_kernel_numpy
+
+def calculate_efficiency_metrics_batch(df):
+    """Vectorized calculate_efficiency_metrics over a summary DataFrame.
+       Reads Affinity_kcal_mol, pKi, NHA, LogP and SASA_A2, and adds LE, LLE, SILE_N, SILE_SASA.
+    """
+    n = len(df)
+    columns = ["Affinity_kcal_mol", "pKi", "NHA", "LogP", "SASA_A2"]
+    aff, pki, nha, logp, sasa = (np.ascontiguousarray(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+                                 for col in columns)
+    out = {key: np.empty(n, dtype=np.float64) for key in ["LE", "LLE", "SILE_N", "SILE_SASA"]}
+    _eff_kernel(aff, pki, nha, logp, sasa, out["LE"], out["LLE"], out["SILE_N"], out["SILE_SASA"])
+    for key, values in out.items():
+        df[key] = values
+    return df
+
 
 def find_ligand_file(ligand_name, search_dirs=["ligands", "ligands_pdbqt"]):
     """Tries to find the original ligand file (SDF preferred)."""
@@ -205,7 +366,7 @@ def find_ligand_file(ligand_name, search_dirs=["ligands", "ligands_pdbqt"]):
          if os.path.exists(potential_path_pdbqt):
             return potential_path_pdbqt, "pdbqt"
 
-    warnings.warn(f"Could not find source file for ligand '{ligand_name}' in {search_dirs}")
+    _warn("ligand_file_not_found", f"Could not find source file for ligand '{ligand_name}' in {search_dirs}")
     return None, None
 
 def load_molecule(file_path, file_type):
@@ -218,13 +379,13 @@ def load_molecule(file_path, file_type):
             if suppl and len(suppl) > 0:
                  mol = suppl[0]
                  if len(suppl) > 1:
-                     warnings.warn(f"SDF file {file_path} contains multiple molecules. Using only the first.")
+                     _warn("SDF_multiple_molecules", f"SDF file {file_path} contains multiple molecules. Using only the first.")
         elif file_type == "pdbqt":
             # RDKit's PDBQT reader is less common, might need custom or rely on basic PDB reader
             # Try reading as PDB, might work for simple cases if ATOM/HETATM lines are standard
              mol = Chem.MolFromPDBFile(file_path, removeHs=False, sanitize=False)
              if mol is None: # Fallback if MolFromPDBFile fails for PDBQT specifics
-                  warnings.warn(f"Could not directly read PDBQT {file_path} with RDKit MolFromPDBFile. Ligand metrics might be missing.")
+                  _warn("PDBQT_read_failed", f"Could not directly read PDBQT {file_path} with RDKit MolFromPDBFile. Ligand metrics might be missing.")
                   # Potential future enhancement: Use OpenBabel API via Pybel if installed
 
         if mol:
@@ -232,77 +393,193 @@ def load_molecule(file_path, file_type):
              try:
                  Chem.SanitizeMol(mol)
              except Exception as sanitize_error:
-                  warnings.warn(f"RDKit sanitization failed for {file_path}: {sanitize_error}")
+                  _warn("sanitization_failed", f"RDKit sanitization failed for {file_path}: {sanitize_error}")
                   return None # Return None if sanitization fails
 
     except Exception as e:
-        warnings.warn(f"Error loading molecule from {file_path}: {e}")
+        _warn("molecule_load_error", f"Error loading molecule from {file_path}: {e}")
         return None # Return None if loading fails
         
     return mol
 
 
-# --- Main Execution ---
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Calculate docking metrics from a Vina log file.")
-    parser.add_argument("vina_log_file", help="Path to the AutoDock Vina output log file.")
-    parser.add_argument("--ligand_dirs", nargs='+', default=["ligands", "ligands_pdbqt"], 
-                        help="Directories to search for original ligand files (SDF preferred, then PDBQT).")
-    
-    args = parser.parse_args()
-
+def load_all_ligands(sdf_path):
+    """Loads every molecule of a multi-molecule SDF, parsing mol blocks on a thread pool.
+       Returns a dict keyed by molecule title (_Name), which must match the ligand names in the logs.
+    """
+    ligands = {}
+    suppl = Chem.MultithreadedSDMolSupplier(sdf_path, sanitize=False, removeHs=False,
+                                            numWriterThreads=os.cpu_count())
+    for mol in suppl:
+        if mol is None:
+            continue
+        name = mol.GetProp("_Name").strip() if mol.HasProp("_Name") else ""
+        if not name:
+            _warn("sdf_untitled", f"Skipping untitled molecule in {sdf_path}")
+            continue
+        try:
+            Chem.SanitizeMol(mol)
+        except Exception as sanitize_error:
+            _warn("sdf_sanitize_failed", f"RDKit sanitization failed for {name} in {sdf_path}: {sanitize_error}")
+            continue
+        ligands[name] = mol
+    return ligands
+
+# Ligands preloaded from an aggregated SDF (set per worker process by _init_worker)
+_LIGAND_MOLS = None
+
+def _init_worker(ligand_mols):
+    """Pool initializer: hands the preloaded ligand dict to each worker once and defers warnings."""
+    global _LIGAND_MOLS, _DEFER_WARNINGS
+    _LIGAND_MOLS = ligand_mols
+    _DEFER_WARNINGS = True
+
+def _score_one(log_file, ligand_dirs=["ligands", "ligands_pdbqt"]):
+    """
+    Parses one Vina log and calculates the intrinsic ligand metrics for it.
+    pKi and efficiency metrics are left as None for the caller to fill in.
+    Returns:
+        dict: Results keyed by RESULT_KEYS
+    """
     # 1. Parse Vina Log
-    receptor_name, ligand_name, affinity = parse_vina_log(args.vina_log_file)
+    receptor_name, ligand_name, affinity = parse_vina_log(log_file)
 
     # Initialize results dictionary with Nones
-    results = {
-        "Receptor": receptor_name, "Ligand": ligand_name, "Affinity": affinity,
-        "pKi": None, "MW": None, "LogP": None, "TPSA": None, "NHA": None, "NRB": None,
-        "HBD": None, "HBA": None, "SASA": None, "QED": None, "LE": None, "LLE": None,
-        "SILE_N": None, "SILE_SASA": None
-    }
+    results = dict.fromkeys(RESULT_KEYS)
+    results.update({"Receptor": receptor_name, "Ligand": ligand_name, "Affinity": affinity})
 
     if receptor_name and ligand_name: # Proceed only if basic info was parsed
-        # 2. Calculate pKi
-        results["pKi"] = calculate_pKi(affinity)
-
-        # 3. Find and Load Ligand File
-        ligand_file_path, ligand_file_type = find_ligand_file(ligand_name, args.ligand_dirs)
-        
+        # 2. Take the preloaded ligand if available, otherwise Find and Load Ligand File
         mol = None
+        if _LIGAND_MOLS and ligand_name in _LIGAND_MOLS:
+            mol = Chem.Mol(_LIGAND_MOLS[ligand_name]) # Copy, metrics sanitize in place
+            ligand_file_path = None
+        else:
+            ligand_file_path, ligand_file_type = find_ligand_file(ligand_name, ligand_dirs)
+
         if ligand_file_path:
             mol = load_molecule(ligand_file_path, ligand_file_type)
             if mol is None:
-                 warnings.warn(f"Failed to load molecule object for {ligand_name} from {ligand_file_path}")
+                 _warn("molecule_load_failed", f"Failed to load molecule object for {ligand_name} from {ligand_file_path}")
 
-        # 4. Calculate Ligand Metrics (intrinsic)
-        if mol:
-            ligand_metrics = calculate_ligand_metrics(mol)
-            results.update(ligand_metrics) # Add MW, LogP etc. to results
-        else:
-            # Ensure ligand metrics stay None if molecule loading failed
-             ligand_metrics = calculate_ligand_metrics(None) 
-             results.update(ligand_metrics)
+        # 3. Calculate Ligand Metrics (intrinsic); stays all None if molecule loading failed
+        results.update(calculate_ligand_metrics(mol))
+
+    return results
+
+def _score_one_counted(log_file, ligand_dirs=["ligands", "ligands_pdbqt"]):
+    """Batch worker: flattens the _score_one result dict into a tuple ordered like RESULT_KEYS
+       (missing metrics as NaN) for the parent's per-column arrays, plus the warning counts it produced."""
+    _WARN_COUNTS.clear()
+    results = _score_one(log_file, ligand_dirs)
+    row = (results["Receptor"], results["Ligand"],
+           *(np.nan if results[key] is None else results[key] for key in RESULT_KEYS[2:]))
+    return row, dict(_WARN_COUNTS)
+
+def process_logs(log_paths, ligand_dirs=["ligands", "ligands_pdbqt"], workers=None, ligand_sdf=None):
+    """
+    Scores many Vina logs in a worker pool so Python/RDKit start-up is paid once per worker.
+    If ligand_sdf is given, all ligands are read from it once up-front instead of one file per log.
+    Returns:
+        pandas.DataFrame: One row per log, columns as in CSV_HEADER
+    """
+    global _DEFER_WARNINGS
+    _DEFER_WARNINGS = True # Count warnings raised in this process too; reported in one summary below
+    ligand_mols = load_all_ligands(ligand_sdf) if ligand_sdf else None
+    score = functools.partial(_score_one_counted, ligand_dirs=ligand_dirs)
+
+    # Columnar accumulation: one preallocated array per column, filled by row index
+    n = len(log_paths)
+    columns = {col: [None] * n for col in CSV_HEADER[:2]}
+    columns.update({col: np.full(n, np.nan, dtype=np.float64) for col in CSV_HEADER[2:]})
+    column_arrays = [columns[col] for col in CSV_HEADER]
+    # ProcessPoolExecutor raises BrokenProcessPool if a worker dies (segfault, OOM kill)
+    # instead of waiting forever for its results like multiprocessing.Pool does
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                                initializer=_init_worker, initargs=(ligand_mols,)) as executor:
+        for i, (row, warn_counts) in enumerate(executor.map(score, log_paths, chunksize=32)):
+            for column, value in zip(column_arrays, row):
+                column[i] = value
+            _WARN_COUNTS.update(warn_counts)
+
+    df = pd.DataFrame(columns)
+
+    # pKi and efficiency metrics in one vectorized pass over all logs
+    df["pKi"] = calculate_pKi_array(df["Affinity_kcal_mol"])
+    _WARN_COUNTS["pKi_failed"] += int((df["pKi"].isna() & df["Affinity_kcal_mol"].notna()).sum())
+    df.loc[df["Receptor"].isna() | df["Ligand"].isna(), "pKi"] = np.nan
+    calculate_efficiency_metrics_batch(df)
+    _WARN_COUNTS["SILE_SASA_zero_SASA"] += int((df["SASA_A2"] <= 1e-6).sum())
+    _emit_warning_summary()
+    _DEFER_WARNINGS = False
+
+    return df.sort_values(["Receptor", "Ligand"], ignore_index=True)
+
+def write_summary_csv(df, output):
+    """Writes the batch summary with the same fixed decimals as the single-log CSV row
+       (e.g. -9.100, 3.50). np.char.mod still applies printf-style formatting to each
+       value; it only saves the per-row dict and type dispatch of the single-log path."""
+    out = df.copy()
+    for col in CSV_HEADER[2:]:
+        values = out[col].to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        fmt = "%d" if col in CSV_COUNT_COLUMNS else f"%.{CSV_DECIMALS[col]}f"
+        text = np.char.mod(fmt, np.where(missing, 0.0, values)).astype(object)
+        text[missing] = "NA" # Use NA for missing values
+        out[col] = text
+    out.to_csv(output, index=False, na_rep="NA")
+
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Calculate docking metrics from a Vina log file.")
+    parser.add_argument("vina_log_file", nargs='?', help="Path to the AutoDock Vina output log file.")
+    parser.add_argument("--batch", metavar="GLOB",
+                        help="Glob of Vina log files (e.g. 'docking_results/**/vina_output.log') to process in parallel. "
+                             "Writes a full CSV including the header.")
+    parser.add_argument("--output", default=None,
+                        help="Output CSV path for --batch (default: stdout).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for --batch (default: all CPU cores).")
+    parser.add_argument("--ligand_sdf", default=None,
+                        help="Multi-molecule SDF with all ligands (titles = ligand names), preloaded once for --batch. "
+                             "Ligands missing from it are still looked up in --ligand_dirs.")
+    parser.add_argument("--ligand_dirs", nargs='+', default=["ligands", "ligands_pdbqt"], 
+                        help="Directories to search for original ligand files (SDF preferred, then PDBQT).")
+    
+    args = parser.parse_args()
+
+    if args.batch:
+        log_paths = sorted(glob.glob(args.batch, recursive=True))
+        if not log_paths:
+            warnings.warn(f"No log files matched: {args.batch}")
+        df = process_logs(log_paths, args.ligand_dirs, args.workers, args.ligand_sdf)
+        write_summary_csv(df, args.output if args.output else sys.stdout)
+        return
+
+    if not args.vina_log_file:
+        parser.error("either vina_log_file or --batch is required")
+
+    # 1-3. Parse Vina Log and calculate intrinsic ligand metrics
+    results = _score_one(args.vina_log_file, args.ligand_dirs)
+    affinity = results["Affinity"]
+
+    if results["Receptor"] and results["Ligand"]: # Proceed only if basic info was parsed
+        # 4. Calculate pKi
+        results["pKi"] = calculate_pKi(affinity)
 
         # 5. Calculate Efficiency Metrics (dependent on affinity/pKi and ligand props)
         if affinity is not None: # Only calculate if affinity exists
-            efficiency_metrics = calculate_efficiency_metrics(affinity, results["pKi"], ligand_metrics)
+            efficiency_metrics = calculate_efficiency_metrics(affinity, results["pKi"], results)
             results.update(efficiency_metrics)
 
     # 6. Format Output as CSV row (handle None values gracefully)
-    header = [
-        "Receptor", "Ligand", "Affinity_kcal_mol", "pKi", "MW", "LogP", "TPSA", "NHA", "NRB",
-        "HBD", "HBA", "SASA_A2", "QED", "LE", "LLE", "SILE_N", "SILE_SASA"
-    ]
-    
     # Use this line if you want the python script to print the header (only useful if running it once)
-    # print(",".join(header)) 
+    # print(",".join(CSV_HEADER)) 
 
     # Format values, replacing None with empty strings or specific markers like 'NA'
     formatted_values = []
-    for key in header:
-        # Map internal keys to header keys if they differ (e.g., Affinity -> Affinity_kcal_mol)
-        internal_key = key.replace('_kcal_mol','').replace('_A2','') # Basic mapping
+    for key, internal_key in zip(CSV_HEADER, RESULT_KEYS):
         value = results.get(internal_key) 
         
         if value is None:
@@ -320,4 +597,7 @@ if __name__ == "__main__":
         else:
             formatted_values.append(str(value)) # Convert other types (int, str) to string
 
-    print(",".join(formatted_values))
\ No newline at end of file
+    print(",".join(formatted_values))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import numpy as np
+
+# Constants for pKi calculation
+R = 1.987204259e-3  # Ideal gas constant in kcal/(mol·K)
+T = 298.15          # Standard temperature in Kelvin (approx. 25 C)
+RT = R * T
+
+def calculate_pKi_array(delta_G_kcal_mol):
+    """Vectorized calculate_pKi for an array of Vina Affinities (kcal/mol).
+       Missing or non-convertible values come back as NaN instead of None.
+       Kept free of RDKit imports so 6_plot_results.py can use it cheaply.
+    """
+    delta_G = np.asarray(delta_G_kcal_mol, dtype=np.float64)
+    with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        # Ki = exp(ΔG / RT); mask non-positive/overflowed Ki before taking the log
+        ki = np.exp(delta_G / RT)
+        pki = -np.log10(np.where((ki > 0) & np.isfinite(ki), ki, np.nan))
+    return pki